@@ -1,172 +1,413 @@
-import yfinance as yf
-import sys
+import concurrent.futures
+import functools
+import json
+import logging
+import os
+import numpy as np
+import pandas as pd
+import tempfile
 import time # Import time for adding delays
 
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache") # On-disk copies of yfinance responses
+CACHE_TTLS = {
+    "info": 6 * 3600, # Seconds a cached info dictionary is considered fresh
+}
+TICKERS_BATCH_SIZE = 20 # Maximum number of symbols grouped into a single yf.Tickers batch
+MAX_FETCH_WORKERS = 8 # Maximum number of concurrent info requests
+RATE_LIMIT_RETRIES = 3 # Retries, with exponential backoff, for a rate-limited info request
+FETCH_TIMEOUT = 30 # Seconds to wait for all outstanding info requests before giving up on them
+
+# Static report text, assembled once at import rather than line by line on every run.
+INTRO_TEXT = "\n".join([
+    "--- PEG Ratio Calculator for Top 10 S&P 500 Companies ---",
+    "Fetching data from Yahoo Finance using 'yfinance'.",
+    "Note: The 'Next 5 Years Earnings Growth' estimate is crucial for PEG and may not be available for all stocks.",
+    "If data is missing, check your internet connection and the yfinance library's status.",
+    "-" * 70,
+])
+INTERPRETATION_TEXT = "\n".join([
+    "\nInterpretation:",
+    "  - PEG < 1: Potentially undervalued relative to growth.",
+    "  - PEG = 1: Fairly valued.",
+    "  - PEG > 1: Potentially overvalued relative to growth.",
+    "  - 'Cannot Calculate' may be due to negative EPS or negative/zero growth rate.",
+    "\n--- End of Report ---",
+])
+
+# Column arrays filled from get_stock_data records, with their dtypes, in order.
+RECORD_DTYPES = {
+    "Ticker": object,
+    "Company Name": object,
+    "Price": np.float64,
+    "EPS": np.float64,
+    "Growth Rate": np.float64,
+}
+
+# Columns of the printed summary table and their widths, in display order.
+SUMMARY_COLUMNS = (
+    ("Ticker", 8),
+    ("Company Name", 25),
+    ("P/E Ratio", 12),
+    ("Growth Rate", 15),
+    ("PEG Ratio", 12),
+    ("Status", 15),
+)
+SUMMARY_COLUMN_NAMES = tuple(name for name, _ in SUMMARY_COLUMNS)
+SUMMARY_ROW_FORMAT = " | ".join(f"{{:<{width}}}" for _, width in SUMMARY_COLUMNS)
+
+TOP_SP500_TICKERS = (
+    "MSFT",  # Microsoft
+    "NVDA",  # Nvidia
+    "AAPL",  # Apple Inc.
+    "AMZN",  # Amazon
+    "GOOGL", # Alphabet Inc. (Class A)
+    "GOOG",  # Alphabet Inc. (Class C)
+    "META",  # Meta Platforms
+    "AVGO",  # Broadcom
+    "BRK.B", # Berkshire Hathaway
+    "TSLA",  # Tesla, Inc.
+)
+
 def calculate_peg_ratio(price, eps, growth_rate):
     """
-    Calculates the PEG (Price/Earnings to Growth) ratio.
+    Calculates the PEG (Price/Earnings to Growth) ratio, either for a single stock or
+    element-wise for whole arrays of stocks in one vectorized pass.
 
     Args:
-        price (float): The current stock price.
-        eps (float): The Earnings Per Share (usually trailing 12 months or forward).
-        growth_rate (float): The annual EPS growth rate as a percentage (e.g., 15 for 15%).
-                             Note: This function expects it as a whole number, not a decimal.
+        price (float or array-like): The current stock price.
+        eps (float or array-like): The Earnings Per Share (usually trailing 12 months or forward).
+        growth_rate (float or array-like): The annual EPS growth rate as a percentage (e.g., 15 for 15%).
+                                           Note: This function expects it as a whole number, not a decimal.
 
     Returns:
-        float: The calculated PEG ratio, or None if calculation is not possible.
+        float or np.ndarray: The calculated PEG ratio, NaN wherever calculation is not possible
+                             (missing values, or non-positive price, EPS or growth rate).
     """
-    if price <= 0:
-        return None
-    if eps <= 0:
-        return None
-    if growth_rate <= 0:
-        return None
+    price, eps, growth_rate = (np.asarray(x, dtype=float) for x in (price, eps, growth_rate))
+    valid = (price > 0) & (eps > 0) & (growth_rate > 0) # NaN compares False, so missing values are invalid too
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        peg_ratio = np.where(valid, price / eps / growth_rate, np.nan)
+    return peg_ratio[()] # Unwraps 0-d results back to a scalar
+
+def format_numbers(values, suffix="", na_rep="N/A"):
+    """
+    Formats a numeric column to two decimal places in a single vectorized pass.
+
+    Args:
+        values (array-like): The numeric values to format; NaN marks a missing value.
+        suffix (str): Text appended to every formatted value (e.g., '%').
+        na_rep (str or array-like): Replacement text for missing values, either one string
+                                    or one string per value.
+
+    Returns:
+        np.ndarray: The formatted values as strings.
+    """
+    values = np.asarray(values, dtype=float)
+    formatted = np.char.add(np.char.mod("%.2f", values), suffix)
+    return np.where(np.isnan(values), na_rep, formatted)
+
+@functools.cache
+def _yf():
+    """
+    Imports yfinance on first use. yfinance pulls in a large dependency tree, and runs
+    served entirely from the on-disk cache never need it.
+
+    Returns:
+        module: The yfinance module.
+    """
+    import yfinance
+    return yfinance
+
+def _cache_path(ticker_symbol, endpoint):
+    """Returns the cache file for one ticker's endpoint: CACHE_DIR/<TICKER>/<endpoint>.json."""
+    return os.path.join(CACHE_DIR, ticker_symbol, f"{endpoint}.json")
 
+def load_cached(ticker_symbol, endpoint):
+    """
+    Loads a previously fetched yfinance response from the on-disk cache.
+
+    Args:
+        ticker_symbol (str): The stock ticker symbol (e.g., 'AAPL', 'MSFT').
+        endpoint (str): The cached yfinance attribute, a key of CACHE_TTLS (e.g., 'info').
+
+    Returns:
+        The cached data, or None if there is no entry, it is older than the endpoint's TTL in
+        CACHE_TTLS, or it cannot be read.
+    """
     try:
-        pe_ratio = price / eps
-        peg_ratio = pe_ratio / growth_rate
-        return peg_ratio
-    except ZeroDivisionError:
+        with open(_cache_path(ticker_symbol, endpoint)) as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
         return None
-    except Exception as e:
+
+    if time.time() - entry.get("ts", 0) > CACHE_TTLS[endpoint]:
         return None
+    return entry.get("data")
+
+def save_cached(ticker_symbol, endpoint, data):
+    """
+    Saves a yfinance response to the on-disk cache so later runs can skip the network.
+    The file is written to a temporary name and then renamed into place, so concurrent runs
+    never read a partially written entry. Failing to write the cache is not an error; the
+    data is simply fetched again next time.
+
+    Args:
+        ticker_symbol (str): The stock ticker symbol (e.g., 'AAPL', 'MSFT').
+        endpoint (str): The cached yfinance attribute, a key of CACHE_TTLS (e.g., 'info').
+        data: The JSON-serializable response to cache.
+    """
+    path = _cache_path(ticker_symbol, endpoint)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with tempfile.NamedTemporaryFile("w", dir=os.path.dirname(path), suffix=".tmp", delete=False) as f:
+            json.dump({"ts": time.time(), "data": data}, f, default=str)
+        os.replace(f.name, path)
+    except OSError:
+        pass
+
+def _is_rate_limited(error):
+    """
+    Checks whether an exception raised by yfinance is Yahoo's HTTP 429 (Too Many Requests).
+
+    Args:
+        error (Exception): The exception raised while fetching data.
+
+    Returns:
+        bool: True if the request was rejected because of rate limiting.
+    """
+    rate_limit_error = getattr(getattr(_yf(), "exceptions", None), "YFRateLimitError", None) # Absent in older yfinance
+    if rate_limit_error is not None and isinstance(error, rate_limit_error):
+        return True
+    return getattr(getattr(error, "response", None), "status_code", None) == 429
 
-def get_stock_data(ticker_symbol):
+def fetch_info(ticker):
     """
-    Fetches stock data (price, EPS, growth rate) using yfinance.
+    Fetches the info dictionary for a single yfinance Ticker and stores it in the on-disk cache.
+
+    This runs on worker threads, so it does not log anything itself; any error output is
+    returned to the caller to be logged on the main thread.
+
+    Args:
+        ticker (yf.Ticker): The Ticker object to fetch info for.
+
+    Returns:
+        tuple: (info, messages), where info is None if the request failed and messages is a
+               list of (level, msg, args) log records.
+    """
+    # Only back off when Yahoo actually rate limits us, instead of delaying every request.
+    for attempt in range(RATE_LIMIT_RETRIES + 1):
+        try:
+            info = ticker.info
+            break
+        except Exception as e:
+            if attempt < RATE_LIMIT_RETRIES and _is_rate_limited(e):
+                time.sleep(min(2 ** attempt, 30)) # Exponential backoff: 1, 2, 4... seconds
+                continue
+            return None, [(
+                logging.ERROR,
+                "An exception occurred while fetching data for '%s': %s. This could indicate a network issue or a breaking change in yfinance/Yahoo Finance structure.",
+                (ticker.ticker, e),
+            )]
+
+    if info:
+        save_cached(ticker.ticker, "info", info)
+    return info, []
+
+def fetch_all_info(ticker_symbols):
+    """
+    Fetches the info dictionaries for all ticker symbols in one pass.
+
+    Symbols with a fresh copy in the on-disk cache are served from it first; if every symbol
+    is a cache hit, yfinance is never imported and no threads are started. The remaining
+    symbols are grouped into yf.Tickers batches of at most TICKERS_BATCH_SIZE, and the
+    per-ticker info requests are resolved concurrently on up to MAX_FETCH_WORKERS threads,
+    since the work is dominated by network round-trips to Yahoo. Requests still outstanding
+    after FETCH_TIMEOUT seconds are reported as failed.
+
+    Args:
+        ticker_symbols (list): The stock ticker symbols to fetch.
+
+    Returns:
+        dict: Maps each ticker symbol to an (info, messages) tuple, as returned by fetch_info.
+    """
+    fetched = {}
+    missing = []
+    for ticker_symbol in ticker_symbols:
+        info = load_cached(ticker_symbol, "info")
+        if info is None:
+            missing.append(ticker_symbol)
+        else:
+            fetched[ticker_symbol] = (info, [])
+
+    if not missing:
+        return fetched
+
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=min(MAX_FETCH_WORKERS, len(missing)))
+    try:
+        futures = {}
+        for start in range(0, len(missing), TICKERS_BATCH_SIZE):
+            batch = missing[start:start + TICKERS_BATCH_SIZE]
+            tickers = _yf().Tickers(" ".join(batch))
+            for ticker_symbol in batch:
+                futures[executor.submit(fetch_info, tickers.tickers[ticker_symbol.upper()])] = ticker_symbol
+        try:
+            for future in concurrent.futures.as_completed(futures, timeout=FETCH_TIMEOUT):
+                fetched[futures[future]] = future.result()
+        except concurrent.futures.TimeoutError:
+            # Report whatever is still outstanding as failed rather than letting one slow symbol stall the run.
+            for ticker_symbol in futures.values():
+                if ticker_symbol not in fetched:
+                    fetched[ticker_symbol] = (None, [(logging.ERROR, "Timed out after %s seconds waiting for data for '%s'.", (FETCH_TIMEOUT, ticker_symbol))])
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    return fetched
+
+def get_stock_data(ticker_symbol, info):
+    """
+    Extracts stock data (price, EPS, growth rate) from a pre-fetched yfinance info dictionary.
     Includes enhanced debugging output to identify missing data points.
 
     Args:
         ticker_symbol (str): The stock ticker symbol (e.g., 'AAPL', 'MSFT').
+        info (dict): The info dictionary returned by fetch_info, or None if fetching failed.
 
     Returns:
-        tuple: (company_name, price, eps, growth_rate_percent) or (None, None, None, None) if data is not found/invalid.
+        tuple: ((company_name, price, eps, growth_rate_percent), messages), where the data tuple is
+               (None, None, None, None) if data is not found/invalid and messages is a list
+               holding at most one (level, msg, args) log record.
     """
-    ticker = yf.Ticker(ticker_symbol)
+    messages = []
+
+    if info is None: # Fetching failed; fetch_info has already reported why
+        return (None, None, None, None), messages
+
+    # --- DEBUGGING START ---
+    # Check if the info dictionary is populated at all
+    # Partially populated dictionaries are handled by the per-field checks below.
+    if not info:
+        messages.append((logging.DEBUG, "Info dictionary for '%s' is empty. This is a major issue.", (ticker_symbol,)))
+        return (None, None, None, None), messages
+
+    company_name = info.get('longName', ticker_symbol)
+
+    # Collect every missing field and report them together as one message for this ticker.
+    issues = []
     
-    # Add a small delay to avoid potential rate limiting, especially when fetching multiple tickers quickly.
-    time.sleep(0.5) # Wait for 0.5 seconds between requests
+    price = info.get('currentPrice')
+    if price is None:
+         price = info.get('regularMarketPrice') # Fallback for real-time price
+         if price is None:
+             issues.append("'currentPrice' and 'regularMarketPrice' are both None (price is missing)")
 
-    try:
-        info = ticker.info
-
-        # --- DEBUGGING START ---
-        # Check if the info dictionary is populated at all
-        if not info or len(info) < 50: # A rough heuristic for sufficient data (info dict usually has many keys)
-            print(f"DEBUG: Info dictionary for '{ticker_symbol}' is empty or incomplete (length: {len(info) if info else 0}). This is a major issue.", file=sys.stderr)
-            return None, None, None, None
-
-        company_name = info.get('longName', ticker_symbol)
-        
-        price = info.get('currentPrice')
-        if price is None:
-             price = info.get('regularMarketPrice') # Fallback for real-time price
-             if price is None:
-                 print(f"DEBUG: For {ticker_symbol}, 'currentPrice' and 'regularMarketPrice' are both None. Price is missing.", file=sys.stderr)
-
-        eps = info.get('trailingEps') 
+    eps = info.get('trailingEps') 
+    if eps is None:
+        eps = info.get('forwardEps') # Try forwardEps as a fallback
         if eps is None:
-            eps = info.get('forwardEps') # Try forwardEps as a fallback
-            if eps is None:
-                print(f"DEBUG: For {ticker_symbol}, 'trailingEps' and 'forwardEps' are both None. EPS is missing.", file=sys.stderr)
-
-        growth_rate_decimal = info.get('nextFiveYearsEarningsGrowth') 
-        if growth_rate_decimal is None:
-            print(f"DEBUG: For {ticker_symbol}, 'nextFiveYearsEarningsGrowth' is None. This is often the reason PEG fails.", file=sys.stderr)
-
-        growth_rate_percent = None
-        if growth_rate_decimal is not None:
-            growth_rate_percent = growth_rate_decimal * 100 # Convert 0.15 to 15
-
-        # Final check before returning None for any missing critical piece
-        if price is None:
-            print(f"DEBUG: Final check for {ticker_symbol}: Price is definitively None.", file=sys.stderr)
-            return company_name, None, None, None
-        if eps is None:
-            print(f"DEBUG: Final check for {ticker_symbol}: EPS is definitively None.", file=sys.stderr)
-            return company_name, None, None, None
-        if growth_rate_percent is None:
-            print(f"DEBUG: Final check for {ticker_symbol}: Growth Rate is definitively None.", file=sys.stderr)
-            return company_name, None, None, None # Crucial for PEG calculation
+            issues.append("'trailingEps' and 'forwardEps' are both None (EPS is missing)")
+
+    growth_rate_decimal = info.get('nextFiveYearsEarningsGrowth') 
+    if growth_rate_decimal is None:
+        issues.append("'nextFiveYearsEarningsGrowth' is None (this is often the reason PEG fails)")
+
+    # Price, EPS and growth rate are all crucial for PEG calculation
+    if issues:
+        messages.append((logging.DEBUG, "For %s: %s.", (ticker_symbol, "; ".join(issues))))
+        return (company_name, None, None, None), messages
+
+    # --- DEBUGGING END ---
+
+    growth_rate_percent = growth_rate_decimal * 100 # Convert 0.15 to 15
+    
+    return (company_name, price, eps, growth_rate_percent), messages
+
+def build_summary_df(ticker_symbols, stock_data):
+    """
+    Builds the formatted summary table from the extracted stock data.
 
-        # --- DEBUGGING END ---
-        
-        return company_name, price, eps, growth_rate_percent
+    This is pure computation with no network access, so callers that re-render the same
+    ticker selection can cache its result.
 
-    except Exception as e:
-        print(f"ERROR: An exception occurred while fetching data for '{ticker_symbol}': {e}", file=sys.stderr)
-        print("This could indicate a network issue or a breaking change in yfinance/Yahoo Finance structure.", file=sys.stderr)
-        return None, None, None, None
+    Args:
+        ticker_symbols (tuple): The ticker symbols to include, in display order.
+        stock_data (dict): Maps each ticker symbol to the data tuple returned by get_stock_data.
+
+    Returns:
+        pd.DataFrame: One row per ticker with the string-formatted SUMMARY_COLUMNS, in order.
+    """
+    # Fill preallocated column arrays in the original ticker order. The numeric columns stay
+    # float64 (NaN when missing) even when every value is None.
+    n = len(ticker_symbols)
+    columns = {name: np.full(n, np.nan if dtype is np.float64 else None, dtype=dtype) for name, dtype in RECORD_DTYPES.items()}
+    for i, ticker_symbol in enumerate(ticker_symbols):
+        company_name, price, eps, growth_rate = stock_data[ticker_symbol]
+        columns["Ticker"][i] = ticker_symbol
+        columns["Company Name"][i] = company_name if company_name else "N/A"
+        if price is not None: # get_stock_data returns either all three values or none of them
+            columns["Price"][i] = price
+            columns["EPS"][i] = eps
+            columns["Growth Rate"][i] = growth_rate
+
+    price, eps, growth_rate = columns["Price"], columns["EPS"], columns["Growth Rate"]
+    success = ~(np.isnan(price) | np.isnan(eps) | np.isnan(growth_rate))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pe_ratio = np.where(eps > 0, price / eps, np.nan) # Calculate P/E even if PEG fails due to growth rate
+    peg_ratio = calculate_peg_ratio(price, eps, growth_rate)
+
+    # Build the display frame once, already formatted and in SUMMARY_COLUMNS order, with each
+    # numeric column formatted in one vectorized pass rather than once per row.
+    return pd.DataFrame({
+        "Ticker": columns["Ticker"],
+        "Company Name": columns["Company Name"],
+        "P/E Ratio": format_numbers(pe_ratio),
+        "Growth Rate": format_numbers(growth_rate, suffix="%"),
+        "PEG Ratio": format_numbers(peg_ratio, na_rep=np.where(success, "Cannot Calculate", "N/A")),
+        "Status": np.where(success, "Success", "Data Missing/Invalid"),
+    }, columns=list(SUMMARY_COLUMN_NAMES))
 
 def main():
     """
     Main function to run the PEG ratio calculator for top S&P 500 companies.
+    Set the FINDASH_LOG_LEVEL environment variable to DEBUG to see why data is missing.
     """
-    print("--- PEG Ratio Calculator for Top 10 S&P 500 Companies ---")
-    print("Fetching data from Yahoo Finance using 'yfinance'.")
-    print("Note: The 'Next 5 Years Earnings Growth' estimate is crucial for PEG and may not be available for all stocks.")
-    print("If data is missing, check your internet connection and the yfinance library's status.")
-    print("-" * 70)
-
-    top_sp500_tickers = [
-        "MSFT",  # Microsoft
-        "NVDA",  # Nvidia
-        "AAPL",  # Apple Inc.
-        "AMZN",  # Amazon
-        "GOOGL", # Alphabet Inc. (Class A)
-        "GOOG",  # Alphabet Inc. (Class C)
-        "META",  # Meta Platforms
-        "AVGO",  # Broadcom
-        "BRK.B", # Berkshire Hathaway
-        "TSLA",  # Tesla, Inc.
-    ]
-
-    results = []
-
-    for ticker_symbol in top_sp500_tickers:
-        print(f"Processing {ticker_symbol}...", end=' ')
-        company_name, price, eps, growth_rate = get_stock_data(ticker_symbol)
-
-        if price is None or eps is None or growth_rate is None:
-            results.append({
-                "Ticker": ticker_symbol,
-                "Company Name": company_name if company_name else "N/A",
-                "Status": "Data Missing/Invalid",
-                "PEG Ratio": "N/A",
-                "P/E Ratio": "N/A",
-                "Growth Rate": "N/A"
-            })
-            print("Skipped (Data Missing)")
-            continue
-
-        peg_ratio = calculate_peg_ratio(price, eps, growth_rate)
-        pe_ratio = price / eps if eps > 0 else "N/A" # Calculate P/E even if PEG fails due to growth rate
-
-        results.append({
-            "Ticker": ticker_symbol,
-            "Company Name": company_name,
-            "Status": "Success",
-            "PEG Ratio": f"{peg_ratio:.2f}" if peg_ratio is not None else "Cannot Calculate",
-            "P/E Ratio": f"{pe_ratio:.2f}" if pe_ratio != "N/A" else "N/A",
-            "Growth Rate": f"{growth_rate:.2f}%"
-        })
-        print("Done")
+    logging.basicConfig(format="%(levelname)s: %(message)s")
+    logger.setLevel(os.environ.get("FINDASH_LOG_LEVEL", "WARNING").upper()) # Leaves yfinance's own loggers at WARNING
+    print(INTRO_TEXT)
+
+    fetched = fetch_all_info(TOP_SP500_TICKERS)
+
+    stock_data = {}
+    all_messages = []
+    for ticker_symbol in TOP_SP500_TICKERS:
+        info, fetch_messages = fetched[ticker_symbol]
+        data, messages = get_stock_data(ticker_symbol, info)
+        stock_data[ticker_symbol] = data
+        all_messages.extend(fetch_messages)
+        all_messages.extend(messages)
+        if None in data[1:]:
+            print(f"Processing {ticker_symbol}... Skipped (Data Missing)")
+        else:
+            print(f"Processing {ticker_symbol}... Done")
+
+    # Emit the collected debugging output once every ticker is processed. Records below the
+    # configured level are dropped by the logger without ever being formatted.
+    for level, msg, args in all_messages:
+        logger.log(level, msg, *args)
+
+    df = build_summary_df(TOP_SP500_TICKERS, stock_data)
 
     print("\n" + "=" * 70)
     print("--- Summary of PEG Ratios for Top S&P 500 Companies ---")
     print("=" * 70)
 
-    print(f"{'Ticker':<8} | {'Company Name':<25} | {'P/E Ratio':<12} | {'Growth Rate':<15} | {'PEG Ratio':<12} | {'Status':<15}")
+    print(SUMMARY_ROW_FORMAT.format(*SUMMARY_COLUMN_NAMES))
     print("-" * 105)
-    for result in results:
-        print(f"{result['Ticker']:<8} | {result['Company Name']:<25} | {result['P/E Ratio']:<12} | {result['Growth Rate']:<15} | {result['PEG Ratio']:<12} | {result['Status']:<15}")
-
-    print("\nInterpretation:")
-    print("  - PEG < 1: Potentially undervalued relative to growth.")
-    print("  - PEG = 1: Fairly valued.")
-    print("  - PEG > 1: Potentially overvalued relative to growth.")
-    print("  - 'Cannot Calculate' may be due to negative EPS or negative/zero growth rate.")
-    print("\n--- End of Report ---")
+    for row in df.itertuples(index=False):
+        print(SUMMARY_ROW_FORMAT.format(*row))
+
+    print(INTERPRETATION_TEXT)
 
 if __name__ == "__main__":
     main()